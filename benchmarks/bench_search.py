@@ -0,0 +1,146 @@
+"""
+Offline throughput benchmark of DmhySearch.search against the local fixture server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search --pages 20 --latency 0.05 --parsers lxml lxml-fast --workers 1 4 8 --processes 0 4
+
+Save a baseline with --json, and compare later runs against it with --baseline to catch regressions.
+The peak memory is the Python heap seen by tracemalloc, memory allocated inside lxml is not counted.
+It is not measured with parser processes, whose memory tracemalloc can not see.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from dmhylib import DmhySearch
+
+from .server import FixtureServer
+
+
+def measure(server: FixtureServer, parser: str, workers: int, processes: int, repeat: int) -> Dict[str, Any]:
+    """Measure one configuration, keeping the best of `repeat` runs for the timings."""
+    with DmhySearch(parser=parser, pool_size=max(workers, 1), retries=0, base_url=server.base_url,
+                    parse_processes=processes) as searcher:
+        # Start the parser processes outside of the timings
+        if processes:
+            searcher.search('bench', workers=workers, max_pages=1)
+
+        # Only the pages with results count: the empty last page and the ones prefetched after it
+        # are requests, not work done
+        page_rows: List[int] = []
+        searcher.stats.add_hook(lambda page: page_rows.append(page.rows))
+
+        best = float('inf')
+        rows = 0
+        pages = 0
+        for _ in range(repeat):
+            page_rows.clear()
+            start = time.perf_counter()
+            searcher.search('bench', workers=workers)
+            elapsed = time.perf_counter() - start
+            if elapsed < best:
+                best = elapsed
+                rows = searcher.sum
+                pages = sum(1 for count in page_rows if count)
+
+        first_result = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = searcher.iter_search('bench', workers=workers)
+            next(results)
+            first_result = min(first_result, time.perf_counter() - start)
+            results.close()
+
+        # tracemalloc slows everything down, so memory gets a run of its own. It only sees this process,
+        # so with parser processes most of the work happens out of its sight and nothing is reported
+        peak = None
+        if not processes:
+            tracemalloc.start()
+            searcher.search('bench', workers=workers)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {
+        'parser': parser,
+        'workers': workers,
+        'processes': processes,
+        'pages': pages,
+        'rows': rows,
+        'seconds': round(best, 4),
+        'pages_per_sec': round(pages / best, 2),
+        'rows_per_sec': round(rows / best, 1),
+        'first_result_ms': round(first_result * 1000, 2),
+        'peak_memory_mb': round(peak / 1048576, 2) if peak is not None else None,
+    }
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    columns = ['parser', 'workers', 'processes', 'pages', 'rows', 'seconds', 'pages_per_sec', 'rows_per_sec',
+               'first_result_ms', 'peak_memory_mb']
+    cells = [['-' if result[column] is None else str(result[column]) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    print('  '.join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def check_regressions(results: List[Dict[str, Any]], baseline_file: str, tolerance: float) -> List[str]:
+    """Compare the rows/sec of each configuration to a saved run, return the regressions found."""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = {(result['parser'], result['workers'], result.get('processes', 0)): result
+                    for result in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['parser'], result['workers'], result['processes']))
+        if previous is None:
+            continue
+        floor = previous['rows_per_sec'] * (1 - tolerance)
+        if result['rows_per_sec'] < floor:
+            regressions.append(f"{result['parser']} x{result['workers']} p{result['processes']}: {result['rows_per_sec']} rows/sec, "
+                               f"baseline {previous['rows_per_sec']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline DmhySearch throughput benchmark")
+    parser.add_argument('--pages', type=int, default=20, help='pages of results served before the empty one')
+    parser.add_argument('--latency', type=float, default=0.05, help='latency added to every response, in seconds')
+    parser.add_argument('--parsers', nargs='+', default=['lxml', 'lxml-fast'], help='parser backends to compare')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 4, 8], help='fetching thread counts')
+    parser.add_argument('--processes', nargs='+', type=int, default=[0],
+                        help='parser process counts, 0 parses in the fetching threads')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per configuration, the best one is kept')
+    parser.add_argument('--json', type=str, help='save the results to this file')
+    parser.add_argument('--baseline', type=str, help='fail if rows/sec fell below this saved run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = []
+    with FixtureServer(pages=args.pages, latency=args.latency) as server:
+        for parser_name in args.parsers:
+            for workers in args.workers:
+                for processes in args.processes:
+                    results.append(measure(server, parser_name, workers, processes, args.repeat))
+
+    print(f"{args.pages} pages, {args.latency * 1000:.0f} ms latency")
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'pages': args.pages, 'latency': args.latency, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        regressions = check_regressions(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import gzip
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGE_PATTERN = re.compile(r'/topics/list/page/(\d+)')
+
+
+def load_fixtures() -> List[bytes]:
+    """Load the fixture result pages, still gzipped, in page order."""
+    names = [name for name in os.listdir(FIXTURES_DIR) if re.match(r'page_\d+\.html\.gz$', name)]
+    pages = []
+    for name in sorted(names, key=lambda name: int(re.search(r'\d+', name).group())):
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+class FixtureServer:
+    """
+    A local stand-in for dmhy.org serving the fixture list pages.
+
+    Pages 1 to `pages` cycle through the fixtures, the following ones are the empty page
+    that ends a search. Every response is delayed by `latency` seconds.
+    """
+
+    def __init__(self, pages: int = 10, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.pages = pages
+        self.latency = latency
+        self.requests = 0
+        self._fixtures = load_fixtures()
+        with open(os.path.join(FIXTURES_DIR, 'empty.html.gz'), 'rb') as f:
+            self._empty = f.read()
+
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/topics/list/page/{{}}?"
+
+    def page(self, number: int) -> bytes:
+        if number > self.pages:
+            return self._empty
+        return self._fixtures[(number - 1) % len(self._fixtures)]
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'FixtureServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, Nagle would hold the body back for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                match = PAGE_PATTERN.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+
+                body = server.page(int(match.group(1)))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    self.send_header('Content-Encoding', 'gzip')
+                else:
+                    body = gzip.decompress(body)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Searches drop their prefetched pages once they meet the empty one
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
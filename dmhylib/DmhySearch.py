@@ -1,67 +1,186 @@
 import csv
 import os
-import re
+import sys
+import threading
 import time
-from collections import OrderedDict
-from typing import List, Optional, Tuple
-from urllib.parse import urlencode, urlparse, parse_qs
-
-from bs4 import BeautifulSoup
+from collections import deque
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlencode
 
 from . import log
-from .url_get import get_url
+from .parse import DEFAULT_TIMEFMT, Row, parse_page, parse_page_timed
+from .result import ResultSet, SearchResult, conversion_factors, size_pattern
+from .stats import PageStats, SearchStats
+from .url_get import DEFAULT_TIMEOUT, create_session, fetch, resolve_proxies
+from .watermark import Watermark
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-size_pattern = re.compile(r'(\d+(?:\.\d+)?)\s*(\w+)')
+    import requests
 
-conversion_factors = OrderedDict([
-    ('B', 1),
-    ('KB', 1024),
-    ('MB', 1048576),
-    ('GB', 1073741824),
-    ('TB', 1099511627776)
-])
+    from .cache import PageCache
+    from .watermark import WatermarkStore
 
 AVAILABLE_SORT_IDS = [0, 2, 31, 3, 41, 42, 4, 43, 44, 15, 6, 7, 9, 17, 18, 19, 20, 21, 12, 1]
 BASE_URL = "https://dmhy.org/topics/list/page/{}?"
 
 
 class DmhySearch:
-    def __init__(self, parser: str = 'lxml', verify: bool = True, timefmt: str = '%Y/%m/%d %H:%M'):
-        self.reset()
-
+    def __init__(self, parser: str = 'lxml', verify: bool = True, timefmt: str = DEFAULT_TIMEFMT,
+                 session: Optional['requests.Session'] = None, pool_size: int = 10, retries: int = 3,
+                 backoff_factor: float = 0.5, proxies: Optional[dict] = None, system_proxy: bool = False,
+                 cache: Optional['PageCache'] = None, state: Optional['WatermarkStore'] = None,
+                 base_url: str = BASE_URL, hooks: Optional[List[Callable[[PageStats], None]]] = None,
+                 parse_processes: int = 0, timeout: Optional[float] = DEFAULT_TIMEOUT):
         self._parser = parser
+        self.base_url = base_url
         self._verify = verify
+        self.cache = cache
+        self.timeout = timeout
+        self.state = state
+        # Counts every page fetched by this object, the hooks are called with the PageStats of each one
+        self.stats = SearchStats(hooks)
+        # With parse_processes > 0 the fetching threads hand the pages to a pool of parser processes,
+        # started on first use and shared by every search of this object
+        self._parse_processes = parse_processes
+        self._parse_pool: Optional['ProcessPoolExecutor'] = None
+        self._warned_parse_processes = False
+        # The fetching threads of the searches in progress, stopped and waited for by close()
+        self._running: Set[Tuple['ThreadPoolExecutor', threading.Event]] = set()
+        self._closed = False
+        self._lock = threading.Lock()
         self.set_timefmt(timefmt)
+        self.reset()
+
+        # The session is shared by every search of this object, so its connections stay alive between pages
+        if session is None:
+            session = create_session(pool_size=pool_size, retries=retries, backoff_factor=backoff_factor,
+                                     proxies=proxies, system_proxy=system_proxy, verify=verify)
+        self.session = session
         log.debug("New search object created.")
 
+    def close(self) -> None:
+        """
+        Stop the fetching threads of the searches in progress and wait for them, then close the HTTP
+        session and stop the parser processes.
+        """
+        with self._lock:
+            self._closed = True
+            running = list(self._running)
+        for executor, cancelled in running:
+            cancelled.set()
+            executor.shutdown(wait=True)
+
+        self.session.close()
+        if self._parse_pool is not None:
+            if sys.version_info >= (3, 9):
+                self._parse_pool.shutdown(cancel_futures=True)
+            else:
+                self._parse_pool.shutdown()
+            self._parse_pool = None
+
+    def __enter__(self) -> 'DmhySearch':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def set_timefmt(self, timefmt: str) -> None:
         """Set and validate the time format."""
         try:
             # Validate the time format by attempting to use it
             time.strftime(timefmt, time.localtime())
             self._timefmt = timefmt
-            self.is_default_format = timefmt == '%Y/%m/%d %H:%M'
+            self.is_default_format = timefmt == DEFAULT_TIMEFMT
         except ValueError:
             raise ValueError(f"Invalid time format: {timefmt}")
 
     def reset(self) -> None:
         self.sum = 0
-        self.times: List[str] = []
-        self.titles: List[str] = []
-        self.sizes: List[str] = []
-        self.magnets: List[str] = []
+        self.results = ResultSet(timefmt=self._timefmt)
         self.time = ""
         self.title = ""
         self.size = ""
         self.magnet = ""
         self.if_selected = False
 
+    @property
+    def times(self) -> List[str]:
+        return self.results.times
+
+    @property
+    def titles(self) -> List[str]:
+        return self.results.titles
+
+    @property
+    def sizes(self) -> List[str]:
+        return self.results.sizes
+
+    @property
+    def magnets(self) -> List[str]:
+        return self.results.magnets
+
     def search(self, keyword: str, sort_id: int = 0, team_id: int = 0, order: str = 'date-desc',
-               proxies: Optional[dict] = None, system_proxy: bool = False) -> None:
+               proxies: Optional[dict] = None, system_proxy: bool = False,
+               workers: int = 1, window: Optional[int] = None,
+               max_results: Optional[int] = None, max_pages: Optional[int] = None,
+               incremental: bool = False) -> None:
+        results = self.iter_search(keyword, sort_id=sort_id, team_id=team_id, order=order,
+                                   proxies=proxies, system_proxy=system_proxy, workers=workers, window=window,
+                                   max_results=max_results, max_pages=max_pages, incremental=incremental)
+        self.reset()
+
+        for result in results:
+            self.sum += 1
+            self.results.append(result)
+
+        log.info("This search is complete: %s", keyword)
+
+    def iter_search(self, keyword: str, sort_id: int = 0, team_id: int = 0, order: str = 'date-desc',
+                    proxies: Optional[dict] = None, system_proxy: bool = False,
+                    workers: int = 1, window: Optional[int] = None,
+                    max_results: Optional[int] = None, max_pages: Optional[int] = None,
+                    stop: Optional[Callable[[SearchResult], bool]] = None,
+                    incremental: bool = False) -> Iterator[SearchResult]:
+        """
+        Search and yield each result as soon as its page is parsed.
+
+        No more pages are requested once a stop condition is met or the generator is closed.
+        The results are not stored in the object, use search() for that.
+
+        Args:
+            max_results (Optional[int]): Stop after this many results.
+            max_pages (Optional[int]): Stop after this many pages.
+            stop (Optional[Callable[[SearchResult], bool]]): Stop at the first result it returns True for,
+                that result is not yielded.
+            incremental (bool): Only yield the results newer than the watermark of the query in the state
+                store, and stop paginating at the first known one.
+
+        Returns:
+            Iterator[SearchResult]: The search results in page order.
+
+        Raises:
+            ValueError: If the sort_id is invalid, or incremental is used without a state store
+                or with another order than 'date-desc'.
+        """
         if sort_id not in AVAILABLE_SORT_IDS:
             raise ValueError(f"'{sort_id}' is not a valid sort_id")
-
-        self.reset()
+        if incremental:
+            if self.state is None:
+                raise ValueError("Incremental search requires a state store")
+            if order != 'date-desc':
+                raise ValueError("Incremental search requires order='date-desc'")
+
+        if self._parse_processes > max(workers, 1) and not self._warned_parse_processes:
+            # Each fetching thread waits for the page it handed over, so extra processes stay idle
+            log.warning("parse_processes (%s) is larger than workers (%s), the extra parser processes will be idle "
+                        "unless several searches run at once.", self._parse_processes, workers)
+            self._warned_parse_processes = True
+
+        # Per-search proxies override the session ones, resolved once for all pages
+        proxies = resolve_proxies(proxies, system_proxy)
         params = urlencode({
             'keyword': keyword,
             'sort_id': sort_id,
@@ -69,41 +188,203 @@ class DmhySearch:
             'order': order
         })
 
-        for page in range(1, 1000):
-            url = BASE_URL.format(page) + params
-            html = get_url(url, verify=self._verify, proxies=proxies, system_proxy=system_proxy)
-            bs = BeautifulSoup(html, self._parser)
-            working = bs.find(id="topic_list")
-
-            if not working:
-                break
-
-            for tr in working.tbody.find_all("tr"):
-                tds = tr.find_all("td")
-                self.sum += 1
-
-                release_time = tds[0].span.content
-                if not self.is_default_format:
-                    release_time = time.strftime(self._timefmt, time.strptime(release_time, '%Y/%m/%d %H:%M'))
-                self.times.append(release_time)
+        if incremental:
+            return self._iter_incremental(params, proxies, workers, window, max_results, max_pages, stop)
+        return self._iter_results(params, proxies, workers, window, max_results, max_pages, stop)
 
-                title = tds[2].find_all("a")[-1].get_text().strip()
-                self.titles.append(title)
+    def _iter_incremental(self, params: str, proxies: Optional[dict], workers: int, window: Optional[int],
+                          max_results: Optional[int], max_pages: Optional[int],
+                          stop: Optional[Callable[[SearchResult], bool]]) -> Iterator[SearchResult]:
+        """
+        Yield the results newer than the watermark of the query, then move the watermark forward.
 
-                url = tds[3].find(class_="download-pp").get("href")
-                magnet = parse_qs(urlparse(url).query)['url'][0]
-                self.magnets.append(magnet)
+        The watermark only moves once the previous one or an empty result page was reached, so a search
+        cut short by max_results, max_pages, stop or an error does not skip the results it did not get to.
+        """
+        watermark = self.state.get(params)
+        reached = False
+        exhausted = False
+
+        def on_last_page() -> None:
+            nonlocal exhausted
+            exhausted = True
+
+        def is_known(result: SearchResult) -> bool:
+            nonlocal reached
+            if watermark is not None and (result.infohash == watermark.infohash
+                                          or result.timestamp < watermark.timestamp):
+                reached = True
+            return reached
+
+        if max_results is not None and max_results <= 0:
+            return
+
+        count = 0
+        newest = None
+        results = self._iter_results(params, proxies, workers, window, None, max_pages, is_known, on_last_page)
+        try:
+            for result in results:
+                if stop is not None and stop(result):
+                    return
+                if newest is None:
+                    newest = result
+
+                yield result
+
+                count += 1
+                if max_results is not None and count >= max_results:
+                    return
+        finally:
+            results.close()
+
+        if newest is not None and (reached or exhausted):
+            self.state.set(params, Watermark(newest.infohash, newest.timestamp))
+            log.debug("Watermark moved to: %s", newest.title)
+
+    def _iter_results(self, params: str, proxies: Optional[dict], workers: int, window: Optional[int],
+                      max_results: Optional[int], max_pages: Optional[int],
+                      stop: Optional[Callable[[SearchResult], bool]],
+                      on_last_page: Optional[Callable[[], None]] = None) -> Iterator[SearchResult]:
+        if max_results is not None and max_results <= 0:
+            return
+
+        count = 0
+        pages = self._iter_pages(params, proxies, workers, window, max_pages, on_last_page)
+        try:
+            for rows in pages:
+                for row in rows:
+                    result = SearchResult(*row)
+                    if stop is not None and stop(result):
+                        return
+
+                    log.debug("Successfully got: %s", result.title)
+                    yield result
+
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+        finally:
+            # Closing the page iterator cancels the pages still in flight
+            pages.close()
+
+    def _iter_pages(self, params: str, proxies: Optional[dict], workers: int = 1,
+                    window: Optional[int] = None,
+                    max_pages: Optional[int] = None,
+                    on_last_page: Optional[Callable[[], None]] = None) -> Iterator[List[Row]]:
+        """
+        Yield the rows of each result page in page order, until an empty page is met.
 
-                self.sizes.append(tds[4].string)
+        Args:
+            params (str): The encoded query string of the search.
+            proxies (Optional[dict]): The resolved proxies of the search.
+            workers (int): The number of threads fetching pages; 1 fetches them one by one.
+            window (Optional[int]): The maximum number of pages in flight, defaults to workers.
+            max_pages (Optional[int]): The maximum number of pages to fetch.
+            on_last_page (Optional[Callable[[], None]]): Called when an empty result page is met, which tells
+                a search that went through every page apart from one stopped by max_pages or an error.
 
-                log.debug(f"Successfully got: {title}")
+        Returns:
+            Iterator[List[Row]]: The rows of each page.
+        """
+        last_page = 999 if max_pages is None else min(max_pages, 999)
+        urls = (self.base_url.format(page) + params for page in range(1, last_page + 1))
+
+        if workers <= 1:
+            for url in urls:
+                rows = self._load_page(url, proxies)
+                if rows is None:
+                    if on_last_page is not None:
+                        on_last_page()
+                    return
+                yield rows
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        window = max(window or workers, 1)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        # Tells the pages already being fetched that nobody wants them anymore
+        cancelled = threading.Event()
+        with self._lock:
+            if self._closed:
+                executor.shutdown()
+                raise RuntimeError("The search object is closed")
+            self._running.add((executor, cancelled))
+        try:
+            for url in islice(urls, window):
+                pending.append(executor.submit(self._load_page, url, proxies, cancelled))
+
+            while pending:
+                rows = pending.popleft().result()
+                if rows is None:
+                    if on_last_page is not None:
+                        on_last_page()
+                    break
+
+                # Keep the window full: one page is done, so the next one can go
+                url = next(urls, None)
+                if url is not None:
+                    pending.append(executor.submit(self._load_page, url, proxies, cancelled))
+                yield rows
+        finally:
+            # The pages after an empty one are empty too, so the outstanding requests are dropped.
+            # The running ones stop at their next check, and are waited for so that none of them
+            # touches the searcher once the search is over
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            with self._lock:
+                self._running.discard((executor, cancelled))
+
+    def _load_page(self, url: str, proxies: Optional[dict],
+                   cancelled: Optional[threading.Event] = None) -> Optional[List[Row]]:
+        """
+        Fetch a result page and extract its rows, or return None if it has no results.
 
-        log.info(f"This search is complete: {keyword}")
+        If `cancelled` is set before the page is fetched or parsed, None is returned and nothing is recorded.
+        """
+        if cancelled is not None and cancelled.is_set():
+            return None
+        start = time.perf_counter()
+        fetched = fetch(url, proxies=proxies, session=self.session, cache=self.cache, timeout=self.timeout)
+        fetch_seconds = time.perf_counter() - start
+
+        if cancelled is not None and cancelled.is_set():
+            return None
+
+        if self._parse_processes > 0:
+            # Only the page bytes and the row tuples cross the process boundary
+            future = self._get_parse_pool().submit(parse_page_timed, fetched.content, self._parser, self._timefmt)
+            rows, timings = future.result()
+        else:
+            timings = {}
+            rows = parse_page(fetched.content, self._parser, self._timefmt, timings)
+        self.stats.record(PageStats(url, fetch_seconds, fetched.bytes_received, timings['parse'], timings['extract'],
+                                    len(rows) if rows else 0, fetched.retries, fetched.cache))
+        return rows
+
+    def _get_parse_pool(self) -> 'ProcessPoolExecutor':
+        with self._lock:
+            # A page finishing after close() must not start a pool that nothing would shut down
+            if self._closed:
+                raise RuntimeError("The search object is closed")
+            if self._parse_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # Forking a process while the fetching threads run is unsafe, so the workers are started fresh
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._parse_pool = ProcessPoolExecutor(max_workers=self._parse_processes,
+                                                       mp_context=multiprocessing.get_context(method))
+                log.debug("Started %s parser processes.", self._parse_processes)
+            return self._parse_pool
 
     def select(self, num: int) -> None:
-        if num < 0 or num >= len(self.times):
+        if num < 0 or num >= len(self.results):
             raise IndexError("Invalid selection index")
-        self.time = self.times[num]
+        self.time = self.results.time(num)
         self.title = self.titles[num]
         self.size = self.sizes[num]
         self.magnet = self.magnets[num]
@@ -136,6 +417,19 @@ class DmhySearch:
                 "magnet": self.magnet
             })
 
+    def export(self, filename: str, format: Optional[str] = None, fields: Optional[Sequence[str]] = None,
+               append: bool = False, compress: Optional[bool] = None) -> int:
+        """
+        Export all the results of the last search to a CSV or JSONL file, see export_results().
+
+        Returns:
+            int: The number of results written.
+        """
+        from .export import export_results
+
+        return export_results(self.results, filename, format=format, fields=fields, append=append,
+                              compress=compress)
+
     @staticmethod
     def convert_byte(value: float, from_unit: str, to_unit: str) -> float:
         """
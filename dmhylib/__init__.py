@@ -1,29 +1,88 @@
+import atexit
 import logging
-from typing import List
+import logging.handlers
+import queue
+from importlib import import_module
+from typing import List, Optional
 
 LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
 LOG_FILE = "dmhy.log"
+LOG_NAME = "global"
 
+# Nothing is written anywhere until the application opts in with setup_logger()
+log = logging.getLogger(LOG_NAME)
+log.addHandler(logging.NullHandler())
 
-def setup_logger(name: str = "global", level: int = logging.DEBUG) -> logging.Logger:
+
+def setup_logger(name: str = LOG_NAME, level: int = logging.DEBUG, log_file: Optional[str] = LOG_FILE,
+                 stream_level: Optional[int] = logging.INFO, use_queue: bool = False) -> logging.Logger:
+    """
+    Attach a file handler and a stream handler to the logger, the library itself attaches none.
+
+    Args:
+        name (str): The name of the logger.
+        level (int): The level of the logger.
+        log_file (Optional[str]): The file receiving every record, None for no file.
+        stream_level (Optional[int]): The level of the records printed to stderr, None for no stream.
+        use_queue (bool): Hand the records to a background thread through a queue, so that
+            the calling threads never wait on the file or the terminal.
+
+    Returns:
+        logging.Logger: The configured logger.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    file_handler = logging.FileHandler(LOG_FILE, mode='w')
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers: List[logging.Handler] = []
+    if log_file is not None:
+        file_handler = logging.FileHandler(log_file, mode='w')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
 
-    stream_handler = logging.StreamHandler()
-    stream_handler.setLevel(logging.INFO)
+    if stream_level is not None:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setLevel(stream_level)
+        handlers.append(stream_handler)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    if use_queue and handlers:
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        handlers = [logging.handlers.QueueHandler(log_queue)]
 
-    return logger
+    for handler in handlers:
+        logger.addHandler(handler)
 
+    return logger
 
-log = setup_logger()
 
 from dmhylib.DmhySearch import DmhySearch
+from dmhylib.result import ResultSet, SearchResult
+from dmhylib.stats import PageStats, SearchStats
+
+# Loaded on first access, so that importing the package does not pull in their dependencies
+_lazy_attributes = {
+    "AsyncDmhySearch": "dmhylib.async_search",
+    "PageCache": "dmhylib.cache",
+    "ResultIndex": "dmhylib.index",
+    "WatermarkStore": "dmhylib.watermark",
+    "export_results": "dmhylib.export",
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_attributes:
+        value = getattr(import_module(_lazy_attributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + list(_lazy_attributes))
+
 
-__all__: List[str] = ["DmhySearch", "log"]
+__all__: List[str] = ["DmhySearch", "AsyncDmhySearch", "PageCache", "PageStats", "ResultIndex", "ResultSet",
+                      "SearchResult", "SearchStats", "WatermarkStore", "export_results", "log", "setup_logger"]
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from collections import deque
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from . import log
+from .DmhySearch import AVAILABLE_SORT_IDS, BASE_URL
+from .parse import DEFAULT_TIMEFMT, Row, parse_page
+from .result import SearchResult
+from .stats import PageStats, SearchStats
+from .url_get import DEFAULT_TIMEOUT, HEADERS
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HostRateLimiter:
+    """Space out the requests made to each host so that at most `rate` start per second."""
+
+    def __init__(self, rate: Optional[float] = None):
+        self._interval = 1 / rate if rate else 0
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        if not self._interval:
+            return
+
+        host = urlparse(url).netloc
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Book the next free slot of the host before sleeping, so concurrent callers queue up behind it
+        slot = max(self._next_slot.get(host, now), now)
+        self._next_slot[host] = slot + self._interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncDmhySearch:
+    """
+    The asyncio counterpart of DmhySearch, meant to run many searches from one event loop.
+
+    All the searches of an object share one HTTP session, one concurrency limit and one per-host
+    rate limit. Results are returned instead of being stored, since searches may run concurrently.
+    Requires aiohttp.
+    """
+
+    def __init__(self, parser: str = 'lxml', verify: bool = True, timefmt: str = DEFAULT_TIMEFMT,
+                 session: Optional['aiohttp.ClientSession'] = None, concurrency: int = 10,
+                 rate: Optional[float] = None, retries: int = 3, backoff_factor: float = 0.5,
+                 proxy: Optional[str] = None, system_proxy: bool = False, base_url: str = BASE_URL,
+                 hooks: Optional[List[Callable[[PageStats], None]]] = None,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT):
+        if aiohttp is None:
+            raise ImportError("AsyncDmhySearch requires aiohttp, install it with: pip install dmhylib[async]")
+
+        # Validate the time format by attempting to use it
+        try:
+            time.strftime(timefmt, time.localtime())
+        except ValueError:
+            raise ValueError(f"Invalid time format: {timefmt}")
+
+        self._parser = parser
+        self._verify = verify
+        self._timefmt = timefmt
+        self.base_url = base_url
+        self._session = session
+        self._own_session = session is None
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiter = HostRateLimiter(rate)
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        # Like DmhySearch, the timeout applies to the connection and to each read
+        self._timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+        self._proxy = proxy
+        self._system_proxy = system_proxy
+        self.stats = SearchStats(hooks)
+        log.debug("New async search object created.")
+
+    async def close(self) -> None:
+        """Close the HTTP session if it was created by this object."""
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncDmhySearch':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        # The session has to be created inside the running event loop
+        if self._session is None:
+            connector = aiohttp.TCPConnector(ssl=None if self._verify else False)
+            self._session = aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                                  trust_env=self._system_proxy)
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Before Python 3.10 a semaphore binds to the event loop current at its creation
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._semaphore
+
+    async def search(self, keyword: str, sort_id: int = 0, team_id: int = 0, order: str = 'date-desc',
+                     window: int = 1, max_results: Optional[int] = None,
+                     max_pages: Optional[int] = None) -> List[SearchResult]:
+        """Search and return all the results in page order."""
+        results = [result async for result in self.iter_search(keyword, sort_id=sort_id, team_id=team_id,
+                                                                order=order, window=window,
+                                                                max_results=max_results, max_pages=max_pages)]
+        log.info("This search is complete: %s", keyword)
+        return results
+
+    def iter_search(self, keyword: str, sort_id: int = 0, team_id: int = 0, order: str = 'date-desc',
+                    window: int = 1, max_results: Optional[int] = None, max_pages: Optional[int] = None,
+                    stop: Optional[Callable[[SearchResult], bool]] = None) -> AsyncIterator[SearchResult]:
+        """
+        Search and yield each result as soon as its page is parsed.
+
+        Args:
+            window (int): The maximum number of pages of this search in flight.
+            max_results (Optional[int]): Stop after this many results.
+            max_pages (Optional[int]): Stop after this many pages.
+            stop (Optional[Callable[[SearchResult], bool]]): Stop at the first result it returns True for,
+                that result is not yielded.
+
+        Returns:
+            AsyncIterator[SearchResult]: The search results in page order.
+
+        Raises:
+            ValueError: If the sort_id is invalid.
+        """
+        if sort_id not in AVAILABLE_SORT_IDS:
+            raise ValueError(f"'{sort_id}' is not a valid sort_id")
+
+        params = urlencode({
+            'keyword': keyword,
+            'sort_id': sort_id,
+            'team_id': team_id,
+            'order': order
+        })
+
+        return self._iter_results(params, window, max_results, max_pages, stop)
+
+    async def _iter_results(self, params: str, window: int, max_results: Optional[int],
+                            max_pages: Optional[int],
+                            stop: Optional[Callable[[SearchResult], bool]]) -> AsyncIterator[SearchResult]:
+        if max_results is not None and max_results <= 0:
+            return
+
+        count = 0
+        pages = self._iter_pages(params, window, max_pages)
+        try:
+            async for rows in pages:
+                for row in rows:
+                    result = SearchResult(*row)
+                    if stop is not None and stop(result):
+                        return
+
+                    log.debug("Successfully got: %s", result.title)
+                    yield result
+
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+        finally:
+            # Closing the page iterator cancels the pages still in flight
+            await pages.aclose()
+
+    async def _iter_pages(self, params: str, window: int,
+                          max_pages: Optional[int]) -> AsyncIterator[List[Row]]:
+        last_page = 999 if max_pages is None else min(max_pages, 999)
+        urls = (self.base_url.format(page) + params for page in range(1, last_page + 1))
+
+        pending = deque(asyncio.ensure_future(self._load_page(url)) for url in islice(urls, max(window, 1)))
+        try:
+            while pending:
+                rows = await pending.popleft()
+                if rows is None:
+                    break
+
+                url = next(urls, None)
+                if url is not None:
+                    pending.append(asyncio.ensure_future(self._load_page(url)))
+                yield rows
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _load_page(self, url: str) -> Optional[List[Row]]:
+        start = time.perf_counter()
+        html, bytes_received, retries = await self._get_url(url)
+        fetch_seconds = time.perf_counter() - start
+
+        # Parsing is CPU work, keep it off the event loop
+        timings = {}
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, partial(parse_page, html, self._parser, self._timefmt, timings))
+        self.stats.record(PageStats(url, fetch_seconds, bytes_received, timings['parse'], timings['extract'],
+                                    len(rows) if rows else 0, retries))
+        return rows
+
+    async def _get_url(self, url: str) -> Tuple[bytes, int, int]:
+        """Return the content of the url, the bytes received and the number of retries made."""
+        session = self._get_session()
+        semaphore = self._get_semaphore()
+
+        for attempt in range(self._retries + 1):
+            last_attempt = attempt == self._retries
+            async with semaphore:
+                await self._limiter.wait(url)
+                try:
+                    async with session.get(url, proxy=self._proxy, timeout=self._timeout) as response:
+                        if response.status not in RETRY_STATUSES or last_attempt:
+                            # A status that is not retried, or outlasted the retries, must not be parsed as an empty page
+                            response.raise_for_status()
+                            content = await response.read()
+                            log.debug("A request has been made to url: %s", url)
+                            # Content-Length is the size before gzip decoding, when the server sends it
+                            return content, response.content_length or len(content), attempt
+                except aiohttp.ClientResponseError:
+                    log.exception("The search was aborted due to network reasons:")
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if last_attempt:
+                        log.exception("The search was aborted due to network reasons:")
+                        raise
+
+            await asyncio.sleep(self._backoff_factor * (2 ** attempt))
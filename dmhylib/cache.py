@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from . import log
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed);
+"""
+
+
+class CacheEntry(NamedTuple):
+    content: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored: float
+
+
+class PageCache:
+    """
+    A persistent cache of result pages, keyed by their full url and stored in SQLite.
+
+    Entries younger than `ttl` seconds are served without any request. Older ones are revalidated
+    with If-None-Match/If-Modified-Since when the server sent an ETag or Last-Modified, so an
+    unchanged page costs a 304 instead of a download. Once the cached pages take more than
+    `max_size` bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = 'dmhy_cache.sqlite3', ttl: float = 300, max_size: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # The connection is shared by the fetching threads, the lock serializes them
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        log.debug("Page cache opened: %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Return the cached page of the url, fresh or not, or None if it is not cached."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT content, etag, last_modified, stored FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET accessed = ? WHERE url = ?", (time.time(), url))
+
+        return CacheEntry(*row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.stored < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """The headers asking the server to answer 304 if the cached page is still valid."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def put(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, content, etag, last_modified, stored, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, content, etag, last_modified, now, now, len(content))
+            )
+            self._evict()
+
+    def refresh(self, url: str) -> None:
+        """Mark a cached page as fresh again, after the server confirmed it did not change."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE pages SET stored = ?, accessed = ? WHERE url = ?", (now, now, url))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        for url, size in self._conn.execute("SELECT url, size FROM pages ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            log.debug("Evicted from the page cache: %s", url)
+            total -= size
+            if total <= self.max_size:
+                break
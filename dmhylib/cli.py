@@ -1,12 +1,36 @@
 import argparse
-from typing import Dict, Any, List, Tuple
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
-from rich.console import Console
-from rich.table import Table
+from . import DmhySearch, setup_logger
+from .export import DEFAULT_FIELDS, EXPORT_FIELDS
+from .stats import SearchStats
+from .result import RAW_TIMEFMT, time_to_timestamp
 
-from . import DmhySearch
 
-console = Console()
+class LazyConsole:
+    """
+    在第一次使用时才创建 rich 控制台，不输出表格的命令无需导入 rich
+    """
+    _console = None
+
+    def __getattr__(self, name: str) -> Any:
+        if LazyConsole._console is None:
+            from rich.console import Console
+            LazyConsole._console = Console()
+        return getattr(LazyConsole._console, name)
+
+
+console = LazyConsole()
+
+# batch 命令的查询参数与输出字段，keyword 字段标明每条结果所属的查询
+QUERY_KEYS = ('keyword', 'sort_id', 'team_id', 'order')
+BATCH_FIELDS = ('keyword',) + EXPORT_FIELDS
+BATCH_DEFAULT_FIELDS = ('keyword',) + DEFAULT_FIELDS
 
 
 def search_dmhy(search_params: Dict[str, Any]) -> Tuple[List[Dict[str, str]], DmhySearch]:
@@ -24,6 +48,8 @@ def search_dmhy(search_params: Dict[str, Any]) -> Tuple[List[Dict[str, str]], Dm
 
 
 def format_results(results: List[Dict[str, str]]) -> None:
+    from rich.table import Table
+
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("序号", style="dim", justify="right", width=4)
     table.add_column("标题", style="dim", width=60, overflow="fold")
@@ -35,6 +61,19 @@ def format_results(results: List[Dict[str, str]]) -> None:
     console.print(table)
 
 
+def print_stats(stats: SearchStats) -> None:
+    """
+    打印搜索各阶段的耗时与计数
+    """
+    values = stats.to_dict()
+    console.print(f"[dim]统计: {values['pages']} 页, {values['rows']} 条结果, "
+                  f"接收 {values['bytes_received'] / 1024:.1f} KiB, 重试 {values['retries']} 次, "
+                  f"缓存命中 {values['cache_hits']} 次, 重新验证 {values['cache_revalidations']} 次[/dim]")
+    console.print(f"[dim]耗时: 下载 {values['fetch_seconds']:.3f}s "
+                  f"(平均 {values['fetch_seconds_avg'] * 1000:.1f} ms, 最长 {values['fetch_seconds_max'] * 1000:.1f} ms), "
+                  f"解析 {values['parse_seconds']:.3f}s, 提取 {values['extract_seconds']:.3f}s[/dim]")
+
+
 def get_user_selection(max_num: int) -> int:
     while True:
         try:
@@ -54,6 +93,8 @@ def handle_search(args: argparse.Namespace) -> None:
             search_params[param] = getattr(args, param)
 
     results, searcher = search_dmhy(search_params)
+    if searcher and args.stats:
+        print_stats(searcher.stats)
     if results and searcher:
         format_results(results)
         selection = get_user_selection(searcher.sum)
@@ -74,8 +115,157 @@ def handle_search(args: argparse.Namespace) -> None:
         console.print("[bold yellow]搜索结果为空[/bold yellow]")
 
 
+def parse_date(value: str) -> int:
+    """
+    将 YYYY-MM-DD 或 YYYY-MM-DD HH:MM 格式的北京时间转换为时间戳
+    """
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time_to_timestamp(datetime.strptime(value, fmt).strftime(RAW_TIMEFMT))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"无效的日期: {value}")
+
+
+def handle_index_add(args: argparse.Namespace) -> None:
+    from .index import ResultIndex
+
+    search_params = {'keyword': args.keyword}
+    for param in ['sort_id', 'team_id', 'order']:
+        if getattr(args, param) is not None:
+            search_params[param] = getattr(args, param)
+
+    try:
+        with DmhySearch(parser='lxml-fast', verify=False, parse_processes=args.processes) as searcher, \
+                ResultIndex(args.db) as index:
+            added = index.ingest(searcher.iter_search(**search_params, workers=args.workers))
+            console.print(f"[bold green]已添加 {added} 条新结果，索引共 {len(index)} 条[/bold green]")
+            if args.stats:
+                print_stats(searcher.stats)
+    except Exception as e:
+        console.print(f"[bold red]索引出错: {str(e)}[/bold red]")
+
+
+def handle_index_query(args: argparse.Namespace) -> None:
+    from rich.table import Table
+
+    from .index import ResultIndex
+
+    with ResultIndex(args.db) as index:
+        results = index.query(keyword=args.keyword, min_size=args.min_size, max_size=args.max_size,
+                              since=args.since, until=args.until, sort_id=args.sort_id, team_id=args.team_id,
+                              limit=args.limit)
+
+    if not results:
+        console.print("[bold yellow]查询结果为空[/bold yellow]")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("时间", style="dim", width=16)
+    table.add_column("标题", style="dim", width=60, overflow="fold")
+    table.add_column("大小", justify="right", style="cyan", width=10)
+    table.add_column("磁链", overflow="fold")
+
+    for result in results:
+        table.add_row(result.time, result.title, result.size, result.magnet)
+
+    console.print(table)
+
+
+def parse_fields(value: str) -> List[str]:
+    """
+    解析以逗号分隔的输出字段
+    """
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    invalid = [field for field in fields if field not in BATCH_FIELDS]
+    if invalid or not fields:
+        raise argparse.ArgumentTypeError(f"无效的字段: {', '.join(invalid) or value}，可用字段: {', '.join(BATCH_FIELDS)}")
+    return fields
+
+
+def read_queries(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    读取查询，每行为一个 JSON 对象（含 keyword，可选 sort_id、team_id、order）或一个关键词，忽略空行和 # 开头的行
+    """
+    queries = []
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith('{'):
+            queries.append({'keyword': line})
+            continue
+
+        try:
+            query = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_no} 行不是有效的 JSON: {e}")
+        unknown = set(query) - set(QUERY_KEYS)
+        if unknown or not isinstance(query.get('keyword'), str):
+            raise ValueError(f"第 {line_no} 行的查询无效，需要 keyword，可选 {', '.join(QUERY_KEYS[1:])}")
+        queries.append(query)
+    return queries
+
+
+def handle_batch(args: argparse.Namespace) -> None:
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        if args.file == '-':
+            queries = read_queries(sys.stdin)
+        else:
+            with open(args.file, encoding='utf-8') as f:
+                queries = read_queries(f)
+    except (OSError, ValueError) as e:
+        print(f"读取查询出错: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    fields = args.fields
+    output_lock = threading.Lock()
+    # 输出管道关闭后（如接了 head），其余查询不再翻页
+    closed = threading.Event()
+
+    def run_query(searcher: DmhySearch, query: Dict[str, Any]) -> Optional[str]:
+        try:
+            for result in searcher.iter_search(**query, workers=args.workers, max_results=args.limit,
+                                               max_pages=args.max_pages, stop=lambda _: closed.is_set()):
+                values = {'keyword': query['keyword']}
+                values.update((field, getattr(result, field)) for field in fields if field != 'keyword')
+                line = json.dumps({field: values[field] for field in fields}, ensure_ascii=False)
+                # 逐行刷新，输出管道关闭时立即发现，其余查询随之停止翻页
+                with output_lock:
+                    if closed.is_set():
+                        break
+                    sys.stdout.write(line + '\n')
+                    sys.stdout.flush()
+        except BrokenPipeError:
+            closed.set()
+        except Exception as e:
+            return f"查询 {query['keyword']} 出错: {e}"
+        return None
+
+    with DmhySearch(parser='lxml-fast', verify=False, pool_size=max(args.jobs * args.workers, 1),
+                    parse_processes=args.processes) as searcher:
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            errors = [error for error in executor.map(lambda query: run_query(searcher, query), queries) if error]
+
+        for error in errors:
+            print(error, file=sys.stderr)
+        if args.stats:
+            print(searcher.stats.summary(), file=sys.stderr)
+
+    if closed.is_set():
+        # 避免退出时再次写入已关闭的管道
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    elif errors:
+        sys.exit(1)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="动漫花园搜索工具:")
+    parser.add_argument('--log-file', type=str, help='将调试日志写入此文件')
+    parser.add_argument('--stats', action='store_true', help='搜索完成后打印各阶段的耗时与计数')
     subparsers = parser.add_subparsers(dest='command')
 
     search = subparsers.add_parser('search',
@@ -86,10 +276,54 @@ def main() -> None:
     search.add_argument('-t', '--team-id', type=int, help='发布团队ID')
     search.add_argument('-o', '--order', type=str, help='排序方式')
 
+    index = subparsers.add_parser('index', help='维护本地结果索引，并在本地离线查询')
+    index_actions = index.add_subparsers(dest='action')
+
+    index_add = index_actions.add_parser('add', help='搜索动漫花园并把结果加入索引')
+    index_add.add_argument('-k', '--keyword', type=str, help='搜索关键词', required=True)
+    index_add.add_argument('-s', '--sort-id', type=int, help='搜索分类ID')
+    index_add.add_argument('-t', '--team-id', type=int, help='发布团队ID')
+    index_add.add_argument('-o', '--order', type=str, help='排序方式')
+    index_add.add_argument('-w', '--workers', type=int, default=4, help='并发抓取的线程数')
+    index_add.add_argument('-p', '--processes', type=int, default=0, help='解析页面的进程数，0 表示在抓取线程中解析')
+    index_add.add_argument('--db', type=str, default='dmhy_index.sqlite3', help='索引文件路径')
+
+    index_query = index_actions.add_parser('query', help='在本地索引中查询')
+    index_query.add_argument('-k', '--keyword', type=str, help='标题关键词，多个关键词用空格分隔')
+    index_query.add_argument('--min-size', type=str, help='最小大小，如 700MB')
+    index_query.add_argument('--max-size', type=str, help='最大大小，如 2GB')
+    index_query.add_argument('--since', type=parse_date, help='最早发布时间，如 2024-01-01')
+    index_query.add_argument('--until', type=parse_date, help='最晚发布时间，如 "2024-06-30 23:59"')
+    index_query.add_argument('-s', '--sort-id', type=int, help='分类ID')
+    index_query.add_argument('-t', '--team-id', type=int, help='发布团队ID')
+    index_query.add_argument('-n', '--limit', type=int, default=100, help='最多显示的结果数')
+    index_query.add_argument('--db', type=str, default='dmhy_index.sqlite3', help='索引文件路径')
+
+    batch = subparsers.add_parser('batch', help='批量搜索，从文件或标准输入读取查询，以 JSONL 格式输出到标准输出')
+    batch.add_argument('file', nargs='?', default='-',
+                       help='查询文件，每行一个 JSON 对象或一个关键词，默认从标准输入读取')
+    batch.add_argument('-j', '--jobs', type=int, default=4, help='同时进行的查询数')
+    batch.add_argument('-w', '--workers', type=int, default=1, help='每个查询并发抓取的线程数')
+    batch.add_argument('-p', '--processes', type=int, default=0, help='解析页面的进程数，0 表示在抓取线程中解析')
+    batch.add_argument('-n', '--limit', type=int, help='每个查询最多输出的结果数')
+    batch.add_argument('--max-pages', type=int, help='每个查询最多请求的页数')
+    batch.add_argument('-f', '--fields', type=parse_fields, default=list(BATCH_DEFAULT_FIELDS),
+                       help=f"以逗号分隔的输出字段，默认为 {','.join(BATCH_DEFAULT_FIELDS)}，"
+                            f"可用字段: {','.join(BATCH_FIELDS)}")
+
     args = parser.parse_args()
+    setup_logger(level=logging.DEBUG if args.log_file else logging.INFO, log_file=args.log_file)
 
     if args.command == 'search':
         handle_search(args)
+    elif args.command == 'batch':
+        handle_batch(args)
+    elif args.command == 'index' and args.action == 'add':
+        handle_index_add(args)
+    elif args.command == 'index' and args.action == 'query':
+        handle_index_query(args)
+    elif args.command == 'index':
+        index.print_help()
     else:
         parser.print_help()
 
@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import json
+from operator import attrgetter
+from typing import Iterable, Optional, Sequence
+
+from . import log
+from .result import SearchResult
+
+DEFAULT_FIELDS = ('time', 'title', 'size', 'magnet')
+EXPORT_FIELDS = ('time', 'title', 'size', 'magnet', 'size_bytes', 'timestamp', 'sort_id', 'team_id', 'infohash')
+FORMATS = ('csv', 'jsonl')
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def export_results(results: Iterable[SearchResult], filename: str, format: Optional[str] = None,
+                   fields: Optional[Sequence[str]] = None, append: bool = False,
+                   compress: Optional[bool] = None) -> int:
+    """
+    Stream search results into a CSV or JSONL file through a single buffered writer.
+
+    Args:
+        results (Iterable[SearchResult]): The results, e.g. a ResultSet or an iter_search() generator.
+        filename (str): The file to write.
+        format (Optional[str]): 'csv' or 'jsonl', guessed from the file extension by default.
+        fields (Optional[Sequence[str]]): The fields to write, among EXPORT_FIELDS, DEFAULT_FIELDS by default.
+        append (bool): Append to the file instead of overwriting it. A CSV header is only written
+            when the file is empty.
+        compress (Optional[bool]): Gzip the output, by default when the filename ends with '.gz'.
+            Appending to a gzip file adds a new gzip member, which readers handle transparently.
+
+    Returns:
+        int: The number of results written.
+
+    Raises:
+        ValueError: If the format or a field is invalid.
+    """
+    if compress is None:
+        compress = filename.endswith('.gz')
+    if format is None:
+        format = filename[:-3] if filename.endswith('.gz') else filename
+        format = format.rsplit('.', 1)[-1].lower()
+    if format not in FORMATS:
+        raise ValueError(f"Invalid export format: {format}")
+
+    if fields is None:
+        fields = DEFAULT_FIELDS
+    invalid = [field for field in fields if field not in EXPORT_FIELDS]
+    if invalid or not fields:
+        raise ValueError(f"Invalid export fields: {', '.join(invalid) or 'none given'}")
+    getter = attrgetter(*fields)
+    # attrgetter returns a bare value instead of a tuple for a single field
+    get_fields = getter if len(fields) > 1 else lambda result: (getter(result),)
+
+    count = 0
+    with open(filename, 'ab' if append else 'wb', buffering=BUFFER_SIZE) as raw:
+        # Append mode starts at the end of the file, so an empty file is at position 0
+        is_empty = raw.tell() == 0
+        binary = gzip.GzipFile(fileobj=raw, mode='ab' if append else 'wb') if compress else raw
+
+        # Closing the text layer flushes it and closes the gzip layer, which leaves the raw file open
+        with io.TextIOWrapper(binary, encoding='utf-8', newline='') as f:
+            if format == 'csv':
+                writer = csv.writer(f)
+                if is_empty:
+                    writer.writerow(fields)
+                for result in results:
+                    writer.writerow(get_fields(result))
+                    count += 1
+            else:
+                for result in results:
+                    f.write(json.dumps(dict(zip(fields, get_fields(result))), ensure_ascii=False))
+                    f.write('\n')
+                    count += 1
+
+    log.info("%s results exported to %s", count, filename)
+    return count
@@ -0,0 +1,182 @@
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, List, Optional, Union
+
+from . import log
+from .result import ResultSet, SearchResult, as_bytes, as_timestamp, format_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    infohash TEXT NOT NULL UNIQUE,
+    timestamp INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    size TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    magnet TEXT NOT NULL,
+    sort_id INTEGER NOT NULL,
+    team_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_timestamp ON results (timestamp);
+CREATE INDEX IF NOT EXISTS results_size_bytes ON results (size_bytes);
+
+-- The trigram tokenizer matches any substring of 3 characters or more, titles are mostly CJK without spaces
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    title, content='results', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+"""
+
+INSERT = ("INSERT OR IGNORE INTO results (infohash, timestamp, title, size, size_bytes, magnet, sort_id, team_id) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+# Terms shorter than a trigram can not use the full text index
+MIN_FTS_TERM = 3
+# The first SQLite release with the trigram tokenizer
+MIN_SQLITE_VERSION = (3, 34, 0)
+
+
+class ResultIndex:
+    """
+    A local SQLite index of harvested search results, for answering queries without crawling.
+
+    Results are deduplicated on their infohash, or on their magnet when they have none.
+    Titles are indexed with FTS5, sizes and release times with ordinary indexes.
+    Requires SQLite 3.34 or later, for the trigram tokenizer.
+    """
+
+    def __init__(self, path: str = 'dmhy_index.sqlite3'):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(f"ResultIndex requires SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or later "
+                               f"for its trigram full text index, this Python uses SQLite {sqlite3.sqlite_version}")
+
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+        log.debug("Result index opened: %s", path)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> 'ResultIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def ingest(self, results: Iterable[SearchResult], batch_size: int = 10000) -> int:
+        """
+        Add search results to the index, skipping the ones already in it.
+
+        Args:
+            results (Iterable[SearchResult]): The results, e.g. a ResultSet or an iter_search() generator.
+            batch_size (int): The number of rows written per transaction.
+
+        Returns:
+            int: The number of new results.
+        """
+        rows = ((result.infohash or result.magnet, result.timestamp, result.title, result.size,
+                 result.size_bytes, result.magnet, result.sort_id, result.team_id) for result in results)
+
+        added = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            with self._conn:
+                # Take the write lock before reading the maximum id, so that no other connection
+                # can commit rows in between that would then be indexed twice
+                self._conn.execute("BEGIN IMMEDIATE")
+                last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+                added += self._conn.executemany(INSERT, batch).rowcount
+                # New rows always get ids above the previous maximum, indexing them in one statement
+                # is much faster than a trigger firing for every row
+                self._conn.execute("INSERT INTO results_fts (rowid, title) SELECT id, title FROM results WHERE id > ?",
+                                   (last_id,))
+
+        log.info("%s new results added to the index", added)
+        return added
+
+    def query(self, keyword: Optional[str] = None, min_size: Optional[Union[int, str]] = None,
+              max_size: Optional[Union[int, str]] = None, since: Optional[Union[int, float, datetime]] = None,
+              until: Optional[Union[int, float, datetime]] = None, sort_id: Optional[int] = None,
+              team_id: Optional[int] = None, limit: Optional[int] = 100) -> ResultSet:
+        """
+        Query the index, newest results first.
+
+        Terms of 3 characters or more are looked up in the full text index. Shorter ones, such as most
+        CJK words, can not use it and are matched with LIKE, which scans every title left by the other
+        conditions: alone, they cost a full table scan.
+
+        Args:
+            keyword (Optional[str]): Space separated terms that must all appear in the title.
+            min_size (Optional[Union[int, str]]): The minimum size, in bytes or as a string like '700MB'.
+            max_size (Optional[Union[int, str]]): The maximum size, in bytes or as a string like '2GB'.
+            since (Optional[Union[int, float, datetime]]): The earliest release time, as a timestamp or datetime.
+            until (Optional[Union[int, float, datetime]]): The latest release time, as a timestamp or datetime.
+            sort_id (Optional[int]): Only the results of this category.
+            team_id (Optional[int]): Only the results of this team.
+            limit (Optional[int]): The maximum number of results, None for all of them.
+
+        Returns:
+            ResultSet: The matching results.
+
+        Raises:
+            ValueError: If a size string is invalid.
+        """
+        conditions: List[str] = []
+        params: list = []
+
+        fts_terms = []
+        for term in (keyword or '').split():
+            if len(term) >= MIN_FTS_TERM:
+                fts_terms.append('"{}"'.format(term.replace('"', '""')))
+            else:
+                conditions.append("title LIKE ? ESCAPE '\\'")
+                params.append('%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')))
+        if fts_terms:
+            conditions.append("id IN (SELECT rowid FROM results_fts WHERE results_fts MATCH ?)")
+            params.append(' AND '.join(fts_terms))
+
+        if min_size is not None:
+            conditions.append("size_bytes >= ?")
+            params.append(as_bytes(min_size))
+        if max_size is not None:
+            conditions.append("size_bytes BETWEEN 0 AND ?")
+            params.append(as_bytes(max_size))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(as_timestamp(since))
+        if until is not None:
+            conditions.append("timestamp <= ?")
+            params.append(as_timestamp(until))
+        if sort_id is not None:
+            conditions.append("sort_id = ?")
+            params.append(sort_id)
+        if team_id is not None:
+            conditions.append("team_id = ?")
+            params.append(team_id)
+
+        sql = "SELECT timestamp, title, size, magnet, size_bytes, sort_id, team_id FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        results = ResultSet()
+        for timestamp, title, size, magnet, size_bytes, row_sort_id, row_team_id in self._conn.execute(sql, params):
+            results.append(SearchResult(format_timestamp(timestamp), title, size, magnet, size_bytes, timestamp,
+                                        row_sort_id, row_team_id))
+        return results
@@ -0,0 +1,165 @@
+import re
+import threading
+from functools import lru_cache
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, unquote_plus
+
+from .result import RAW_TIMEFMT, format_timestamp, size_to_bytes, time_to_timestamp
+
+if TYPE_CHECKING:
+    from lxml import etree
+
+DEFAULT_TIMEFMT = RAW_TIMEFMT
+FAST_PARSER = 'lxml-fast'
+
+# (time, title, size, magnet, size_bytes, timestamp, sort_id, team_id), the fields of a SearchResult
+Row = Tuple[str, str, str, str, int, int, int, int]
+
+magnet_pattern = re.compile(r'[?&]url=([^&#]*)')
+sort_id_pattern = re.compile(r'/sort_id/(\d+)')
+team_id_pattern = re.compile(r'/team_id/(\d+)')
+
+FAST_XPATHS = {
+    'topic_list': '(//*[@id="topic_list"])[1]',
+    'rows': '(.//tbody)[1]//tr',
+    'cells': 'td',
+    'time': 'string(span)',
+    'title': 'string((.//a)[last()])',
+    'download_pp': 'string((.//*[contains(concat(" ", normalize-space(@class), " "), " download-pp ")])[1]/@href)',
+    'size': 'string(.)',
+    'sort_link': 'string((.//a)[1]/@href)',
+    'team_link': 'string((.//*[contains(concat(" ", normalize-space(@class), " "), " tag ")]//a)[1]/@href)',
+}
+
+
+@lru_cache(maxsize=None)
+def _compiled_xpaths() -> Dict[str, 'etree.XPath']:
+    """Compile the XPath of the fast parser once, on first use, so lxml is only imported when needed."""
+    from lxml import etree
+
+    # smart_strings=False returns plain str that do not keep the tree alive
+    return {name: etree.XPath(path, smart_strings=False) for name, path in FAST_XPATHS.items()}
+
+
+# lxml parsers must not be shared between threads
+_local = threading.local()
+
+
+def parse_page(html: bytes, parser: str = 'lxml', timefmt: str = DEFAULT_TIMEFMT,
+               timings: Optional[Dict[str, float]] = None) -> Optional[List[Row]]:
+    """
+    Extract the rows of a result page.
+
+    Args:
+        html (bytes): The content of the page.
+        parser (str): The BeautifulSoup parser to use, or 'lxml-fast' to query the page with XPath.
+        timefmt (str): The format of the release times.
+        timings (Optional[Dict[str, float]]): If given, receives the seconds spent building the tree
+            under 'parse' and extracting the rows, times included, under 'extract'.
+
+    Returns:
+        Optional[List[Row]]: The (time, title, size, magnet, size_bytes, timestamp, sort_id, team_id) rows,
+        or None if the page has no results.
+    """
+    if timings is None:
+        timings = {}
+    if parser == FAST_PARSER:
+        return _parse_page_fast(html, timefmt, timings)
+
+    from bs4 import BeautifulSoup
+
+    start = perf_counter()
+    bs = BeautifulSoup(html, parser)
+    parsed = perf_counter()
+    timings['parse'] = parsed - start
+    timings['extract'] = 0.0
+
+    working = bs.find(id="topic_list")
+    if not working:
+        return None
+
+    rows = []
+    for tr in working.tbody.find_all("tr"):
+        tds = tr.find_all("td")
+
+        release_time = str(tds[0].span.string)
+        timestamp = time_to_timestamp(release_time)
+        if timefmt != DEFAULT_TIMEFMT:
+            release_time = format_timestamp(timestamp, timefmt)
+
+        title = tds[2].find_all("a")[-1].get_text().strip()
+
+        url = tds[3].find(class_="download-pp").get("href")
+        magnet = parse_qs(urlparse(url).query)['url'][0]
+
+        sort_link = tds[1].a
+        sort_id = _link_id(sort_id_pattern, sort_link.get("href") if sort_link else "")
+
+        team_tag = tds[2].find(class_="tag")
+        team_link = team_tag.a if team_tag else None
+        team_id = _link_id(team_id_pattern, team_link.get("href") if team_link else "")
+
+        size = str(tds[4].string)
+        rows.append((release_time, title, size, magnet, size_to_bytes(size), timestamp, sort_id, team_id))
+
+    timings['extract'] = perf_counter() - parsed
+    return rows
+
+
+def parse_page_timed(html: bytes, parser: str = 'lxml',
+                     timefmt: str = DEFAULT_TIMEFMT) -> Tuple[Optional[List[Row]], Dict[str, float]]:
+    """Call parse_page() and return its timings along with the rows, so that a worker process can send both back."""
+    timings = {}
+    return parse_page(html, parser, timefmt, timings), timings
+
+
+def _link_id(pattern: re.Pattern, href: str) -> int:
+    """Take the sort or team id out of a list link, 0 if there is none."""
+    match = pattern.search(href)
+    return int(match.group(1)) if match else 0
+
+
+def _parse_page_fast(html: bytes, timefmt: str, timings: Dict[str, float]) -> Optional[List[Row]]:
+    """Extract the same rows as parse_page() with compiled XPath over an lxml tree."""
+    from lxml import etree
+
+    xpaths = _compiled_xpaths()
+    html_parser = getattr(_local, 'parser', None)
+    if html_parser is None:
+        html_parser = _local.parser = etree.HTMLParser(encoding='utf-8')
+
+    start = perf_counter()
+    root = etree.fromstring(html, html_parser)
+    parsed = perf_counter()
+    timings['parse'] = parsed - start
+    timings['extract'] = 0.0
+    if root is None:
+        return None
+
+    working = xpaths['topic_list'](root)
+    if not working:
+        return None
+
+    rows = []
+    for tr in xpaths['rows'](working[0]):
+        tds = xpaths['cells'](tr)
+
+        release_time = xpaths['time'](tds[0])
+        timestamp = time_to_timestamp(release_time)
+        if timefmt != DEFAULT_TIMEFMT:
+            release_time = format_timestamp(timestamp, timefmt)
+
+        title = xpaths['title'](tds[2]).strip()
+
+        # A regex on the link is enough to get the magnet, no need to parse the whole url
+        magnet = unquote_plus(magnet_pattern.search(xpaths['download_pp'](tds[3])).group(1))
+
+        sort_id = _link_id(sort_id_pattern, xpaths['sort_link'](tds[1]))
+        team_id = _link_id(team_id_pattern, xpaths['team_link'](tds[2]))
+
+        size = xpaths['size'](tds[4])
+        rows.append((release_time, title, size, magnet, size_to_bytes(size), timestamp, sort_id, team_id))
+
+    timings['extract'] = perf_counter() - parsed
+    return rows
@@ -0,0 +1,243 @@
+import calendar
+import re
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
+
+size_pattern = re.compile(r'(\d+(?:\.\d+)?)\s*(\w+)')
+infohash_pattern = re.compile(r'urn:btih:([0-9A-Za-z]+)')
+
+conversion_factors = OrderedDict([
+    ('B', 1),
+    ('KB', 1024),
+    ('MB', 1048576),
+    ('GB', 1073741824),
+    ('TB', 1099511627776)
+])
+
+# dmhy.org lists its release times in Beijing time
+DMHY_UTC_OFFSET = 8 * 3600
+RAW_TIMEFMT = '%Y/%m/%d %H:%M'
+
+
+def size_to_bytes(size: str) -> int:
+    """
+    Convert a size string like '1.2GB' to a number of bytes.
+
+    Returns:
+        int: The number of bytes, or -1 if the size can not be parsed.
+    """
+    match = size_pattern.match(size)
+    if not match:
+        return -1
+
+    factor = conversion_factors.get(match.group(2).upper())
+    if factor is None:
+        return -1
+
+    return int(float(match.group(1)) * factor)
+
+
+def time_to_timestamp(release_time: str) -> int:
+    """
+    Convert a release time as listed by dmhy.org ('%Y/%m/%d %H:%M', Beijing time) to an epoch timestamp.
+
+    Raises:
+        ValueError: If the release time is invalid.
+    """
+    try:
+        # Slicing is much cheaper than strptime for the fixed format of the site
+        fields = (int(release_time[0:4]), int(release_time[5:7]), int(release_time[8:10]),
+                  int(release_time[11:13]), int(release_time[14:16]), 0)
+    except ValueError:
+        fields = time.strptime(release_time, RAW_TIMEFMT)[:6]
+
+    return calendar.timegm(fields) - DMHY_UTC_OFFSET
+
+
+def format_timestamp(timestamp: int, timefmt: str = RAW_TIMEFMT) -> str:
+    """Format an epoch timestamp in Beijing time, the way dmhy.org lists it."""
+    return time.strftime(timefmt, time.gmtime(timestamp + DMHY_UTC_OFFSET))
+
+
+def as_bytes(size: Union[int, str]) -> int:
+    """Take a size bound given in bytes or as a string like '2GB'."""
+    if isinstance(size, str):
+        value = size_to_bytes(size)
+        if value < 0:
+            raise ValueError(f"Extract: invalid size '{size}'")
+        return value
+    return size
+
+
+def as_timestamp(moment: Union[int, float, datetime]) -> float:
+    """Take a time bound given as an epoch timestamp or a datetime."""
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    return moment
+
+
+class SearchResult(NamedTuple):
+    """A single row of the search results."""
+    time: str
+    title: str
+    size: str
+    magnet: str
+    size_bytes: int = -1
+    timestamp: int = 0
+    sort_id: int = 0
+    team_id: int = 0
+
+    @property
+    def infohash(self) -> str:
+        """The lowercase BitTorrent infohash of the magnet, or an empty string if it has none."""
+        match = infohash_pattern.search(self.magnet)
+        return match.group(1).lower() if match else ''
+
+
+class ResultSet:
+    """
+    A compact, column-oriented store of search results.
+
+    Sizes are also kept as integer bytes and release times as epoch timestamps, both in arrays,
+    so that filtering, sorting and unit conversion never have to parse strings again.
+    Rows whose size could not be parsed have a size_bytes of -1.
+
+    The release times are only stored as timestamps, which is what makes a row smaller than with
+    one string per field. The `times` list is formatted from them with `timefmt` on first access,
+    then kept up to date by append(), so indexing it stays cheap and changes made to it are kept.
+    That list adds one string per row back: read single rows with time() to avoid building it.
+    """
+
+    __slots__ = ('timefmt', '_times', 'titles', 'sizes', 'magnets', 'size_bytes', 'timestamps', 'sort_ids',
+                 'team_ids')
+
+    def __init__(self, results: Iterable[SearchResult] = (), timefmt: str = RAW_TIMEFMT):
+        self.timefmt = timefmt
+        self._times: Optional[List[str]] = None
+        self.titles: List[str] = []
+        self.sizes: List[str] = []
+        self.magnets: List[str] = []
+        self.size_bytes = array('q')
+        self.timestamps = array('q')
+        self.sort_ids = array('l')
+        self.team_ids = array('l')
+        self.extend(results)
+
+    def append(self, result: SearchResult) -> None:
+        if self._times is not None:
+            self._times.append(format_timestamp(result.timestamp, self.timefmt))
+        self.titles.append(result.title)
+        self.sizes.append(result.size)
+        self.magnets.append(result.magnet)
+        self.size_bytes.append(result.size_bytes)
+        self.timestamps.append(result.timestamp)
+        self.sort_ids.append(result.sort_id)
+        self.team_ids.append(result.team_id)
+
+    def extend(self, results: Iterable[SearchResult]) -> None:
+        for result in results:
+            self.append(result)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __getitem__(self, index: int) -> SearchResult:
+        return SearchResult(self.time(index), self.titles[index], self.sizes[index], self.magnets[index],
+                            self.size_bytes[index], self.timestamps[index], self.sort_ids[index],
+                            self.team_ids[index])
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def time(self, index: int) -> str:
+        """The release time of a row, in the time format of the set."""
+        if self._times is not None:
+            return self._times[index]
+        return format_timestamp(self.timestamps[index], self.timefmt)
+
+    @property
+    def times(self) -> List[str]:
+        """The release times of all the rows, in the time format of the set."""
+        if self._times is None:
+            self._times = [format_timestamp(timestamp, self.timefmt) for timestamp in self.timestamps]
+        return self._times
+
+    def take(self, indices: Iterable[int]) -> 'ResultSet':
+        """Return a new set made of the given rows, in the given order."""
+        taken = ResultSet(timefmt=self.timefmt)
+        for index in indices:
+            taken.titles.append(self.titles[index])
+            taken.sizes.append(self.sizes[index])
+            taken.magnets.append(self.magnets[index])
+            taken.size_bytes.append(self.size_bytes[index])
+            taken.timestamps.append(self.timestamps[index])
+            taken.sort_ids.append(self.sort_ids[index])
+            taken.team_ids.append(self.team_ids[index])
+        return taken
+
+    def filter(self, min_size: Optional[Union[int, str]] = None, max_size: Optional[Union[int, str]] = None,
+               since: Optional[Union[int, float, datetime]] = None,
+               until: Optional[Union[int, float, datetime]] = None) -> 'ResultSet':
+        """
+        Return the rows within the given bounds, all of them inclusive.
+
+        Args:
+            min_size (Optional[Union[int, str]]): The minimum size, in bytes or as a string like '700MB'.
+            max_size (Optional[Union[int, str]]): The maximum size, in bytes or as a string like '2GB'.
+            since (Optional[Union[int, float, datetime]]): The earliest release time, as a timestamp or datetime.
+            until (Optional[Union[int, float, datetime]]): The latest release time, as a timestamp or datetime.
+
+        Returns:
+            ResultSet: The matching rows, in their current order.
+
+        Raises:
+            ValueError: If a size string is invalid.
+        """
+        indices = range(len(self))
+
+        if min_size is not None:
+            low = as_bytes(min_size)
+            indices = [i for i in indices if self.size_bytes[i] >= low]
+        if max_size is not None:
+            high = as_bytes(max_size)
+            # Rows of unknown size are not known to be under the limit
+            indices = [i for i in indices if 0 <= self.size_bytes[i] <= high]
+        if since is not None:
+            start = as_timestamp(since)
+            indices = [i for i in indices if self.timestamps[i] >= start]
+        if until is not None:
+            end = as_timestamp(until)
+            indices = [i for i in indices if self.timestamps[i] <= end]
+
+        return self.take(indices)
+
+    def sort(self, by: str = 'time', reverse: bool = False) -> 'ResultSet':
+        """
+        Return the rows sorted by 'time', 'size' or 'title'.
+
+        Raises:
+            ValueError: If the sort key is invalid.
+        """
+        columns = {'time': self.timestamps, 'size': self.size_bytes, 'title': self.titles}
+        if by not in columns:
+            raise ValueError(f"Invalid sort key: {by}")
+
+        return self.take(sorted(range(len(self)), key=columns[by].__getitem__, reverse=reverse))
+
+    def sizes_in(self, unit: str = 'MB') -> List[float]:
+        """
+        Return the sizes of all the rows converted to the given unit, -1 for unknown sizes.
+
+        Raises:
+            ValueError: If an invalid storage unit is provided.
+        """
+        try:
+            factor = conversion_factors[unit.upper()]
+        except KeyError as e:
+            raise ValueError(f"Convert: invalid storage unit '{e.args[0]}'") from e
+
+        return [round(size / factor, 2) if size >= 0 else -1 for size in self.size_bytes]
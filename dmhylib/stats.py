@@ -0,0 +1,102 @@
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+# How a page was obtained when a cache is in use
+CACHE_HIT = 'hit'
+CACHE_REVALIDATED = 'revalidated'
+CACHE_MISS = 'miss'
+
+
+class PageStats(NamedTuple):
+    """What it took to get the rows of one result page."""
+    url: str
+    fetch_seconds: float
+    bytes_received: int
+    parse_seconds: float
+    extract_seconds: float
+    rows: int
+    retries: int = 0
+    cache: Optional[str] = None
+
+
+# name: (help, PageStats field or None for a page count)
+COUNTERS = {
+    'pages': ('Result pages fetched.', None),
+    'bytes_received': ('Bytes received over the network.', 'bytes_received'),
+    'fetch_seconds': ('Time spent fetching pages.', 'fetch_seconds'),
+    'parse_seconds': ('Time spent parsing the HTML of pages.', 'parse_seconds'),
+    'extract_seconds': ('Time spent extracting and formatting rows.', 'extract_seconds'),
+    'rows': ('Rows extracted.', 'rows'),
+    'retries': ('Requests retried.', 'retries'),
+}
+
+
+class SearchStats:
+    """
+    Counters of the pages fetched by a searcher, with optional hooks called after every page.
+
+    The counters add up over all the searches of the searcher until reset() is called. Only the totals
+    are kept, the hooks are the way to see each page. Pages may be recorded from several fetching
+    threads at once.
+    """
+
+    def __init__(self, hooks: Optional[List[Callable[[PageStats], None]]] = None):
+        self.hooks: List[Callable[[PageStats], None]] = list(hooks or [])
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: Dict[str, Union[int, float]] = {name: 0 for name in COUNTERS}
+            self.cache_hits = 0
+            self.cache_revalidations = 0
+            self.fetch_seconds_max = 0.0
+
+    def add_hook(self, hook: Callable[[PageStats], None]) -> None:
+        self.hooks.append(hook)
+
+    def record(self, page: PageStats) -> None:
+        with self._lock:
+            for name, (_, field) in COUNTERS.items():
+                self.counters[name] += 1 if field is None else getattr(page, field)
+            if page.cache == CACHE_HIT:
+                self.cache_hits += 1
+            elif page.cache == CACHE_REVALIDATED:
+                self.cache_revalidations += 1
+            self.fetch_seconds_max = max(self.fetch_seconds_max, page.fetch_seconds)
+
+        for hook in self.hooks:
+            hook(page)
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            result = dict(self.counters)
+            result['cache_hits'] = self.cache_hits
+            result['cache_revalidations'] = self.cache_revalidations
+            result['fetch_seconds_max'] = self.fetch_seconds_max
+
+        result['fetch_seconds_avg'] = result['fetch_seconds'] / result['pages'] if result['pages'] else 0.0
+        return result
+
+    def to_prometheus(self, prefix: str = 'dmhylib') -> str:
+        """Export the counters in the Prometheus text format."""
+        values = self.to_dict()
+        metrics = [(name, help_text) for name, (help_text, _) in COUNTERS.items()]
+        metrics += [('cache_hits', 'Pages served from the cache without a request.'),
+                    ('cache_revalidations', 'Cached pages confirmed unchanged by the server.')]
+
+        lines = []
+        for name, help_text in metrics:
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {values[name]}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        values = self.to_dict()
+        return (f"{values['pages']} pages, {values['rows']} rows, {values['bytes_received'] / 1024:.1f} KiB received, "
+                f"fetch {values['fetch_seconds']:.3f}s (avg {values['fetch_seconds_avg'] * 1000:.1f} ms, "
+                f"max {values['fetch_seconds_max'] * 1000:.1f} ms), parse {values['parse_seconds']:.3f}s, "
+                f"extract {values['extract_seconds']:.3f}s, {values['retries']} retries, "
+                f"{values['cache_hits']} cache hits, {values['cache_revalidations']} revalidations")
@@ -1,15 +1,33 @@
 import os
-
-import requests
+from typing import TYPE_CHECKING, NamedTuple, Optional
 
 from . import log
+from .stats import CACHE_HIT, CACHE_MISS, CACHE_REVALIDATED
+
+if TYPE_CHECKING:
+    import requests
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.122 Safari/537.36",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive"
+}
 
+# Seconds to wait for the connection and then for each read, so that a stalled socket is retried
+DEFAULT_TIMEOUT = 30
 
-def get_url(url, proxies=None, system_proxy=False, verify=True):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.122 Safari/537.36"
-    }
 
+def resolve_proxies(proxies: Optional[dict] = None, system_proxy: bool = False) -> Optional[dict]:
+    """
+    Work out which proxies a request should go through.
+
+    Args:
+        proxies (Optional[dict]): Explicit proxies, used as is when system_proxy is False.
+        system_proxy (bool): Read the proxies from the http_proxy/https_proxy environment variables.
+
+    Returns:
+        Optional[dict]: The proxies to use, or None for a direct connection.
+    """
     if system_proxy:
         proxies = {
             'http': os.environ.get('http_proxy'),
@@ -19,14 +37,116 @@ def get_url(url, proxies=None, system_proxy=False, verify=True):
             log.warning("No system proxy found.")
             proxies = None
 
+    return proxies
+
+
+def create_session(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5,
+                   proxies: Optional[dict] = None, system_proxy: bool = False,
+                   verify: bool = True) -> 'requests.Session':
+    """
+    Create a keep-alive session with a connection pool and retry/backoff.
+
+    Args:
+        pool_size (int): The number of connections kept alive per host.
+        retries (int): How many times a failed request is retried.
+        backoff_factor (float): The base of the exponential backoff between retries, in seconds.
+        proxies (Optional[dict]): The proxies used by every request of the session.
+        system_proxy (bool): Use the system proxy instead of the given proxies.
+        verify (bool): Whether to verify the SSL certificate.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+
+    session.proxies = resolve_proxies(proxies, system_proxy) or {}
+    session.verify = verify
+    if not verify:
+        requests.packages.urllib3.disable_warnings()
+
+    log.debug("New session created with pool size %s and %s retries.", pool_size, retries)
+    return session
+
+
+class FetchResult(NamedTuple):
+    content: bytes
+    bytes_received: int
+    retries: int
+    cache: Optional[str]
+
+
+def get_url(url, proxies=None, system_proxy=False, verify=True, session=None, cache=None, timeout=DEFAULT_TIMEOUT):
+    return fetch(url, proxies=proxies, system_proxy=system_proxy, verify=verify, session=session, cache=cache,
+                 timeout=timeout).content
+
+
+def fetch(url, proxies=None, system_proxy=False, verify=True, session=None, cache=None,
+          timeout=DEFAULT_TIMEOUT) -> FetchResult:
+    """Like get_url(), but also tell how many bytes went over the wire, how many retries were made
+    and whether the cache answered."""
+    import requests
+
+    entry = None
+    headers = {}
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None and cache.is_fresh(entry):
+            log.debug("Got url from the cache: %s", url)
+            return FetchResult(entry.content, 0, 0, CACHE_HIT)
+        headers = cache.conditional_headers(entry)
+
     try:
-        if not verify:
-            requests.packages.urllib3.disable_warnings()
+        if session is None:
+            proxies = resolve_proxies(proxies, system_proxy)
+            if not verify:
+                requests.packages.urllib3.disable_warnings()
+            response = requests.get(url, headers={**HEADERS, **headers}, proxies=proxies, verify=verify,
+                                    timeout=timeout)
+        else:
+            # Proxies and verification were resolved when the session was created
+            response = session.get(url, headers=headers, proxies=proxies, timeout=timeout)
 
-        response = requests.get(url, headers=headers, proxies=proxies, verify=verify)
-        log.debug(f"A request has been made to url: {url}")
-        return response.content
+        log.debug("A request has been made to url: %s", url)
+        # An error status that outlasted the retries must not be parsed as an empty result page
+        response.raise_for_status()
 
     except requests.RequestException:
         log.exception("The search was aborted due to network reasons:")
         raise
+
+    content = response.content
+    # urllib3 counts the bytes read from the socket, before gzip decoding
+    raw = response.raw
+    bytes_received = raw.tell() if hasattr(raw, 'tell') else len(content)
+    retry = getattr(raw, 'retries', None)
+    retries = len(retry.history) if retry is not None else 0
+
+    status = None
+    if cache is not None:
+        status = CACHE_MISS
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(url)
+            return FetchResult(entry.content, bytes_received, retries, CACHE_REVALIDATED)
+        if response.status_code == 200:
+            cache.put(url, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    return FetchResult(content, bytes_received, retries, status)
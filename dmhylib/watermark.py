@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+from . import log
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    key TEXT PRIMARY KEY,
+    infohash TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+"""
+
+
+class Watermark(NamedTuple):
+    """The newest result already seen by a query."""
+    infohash: str
+    timestamp: int
+
+
+class WatermarkStore:
+    """
+    The watermark of each query, for incremental searches, stored in SQLite.
+
+    Every update only writes the row of its query, in a transaction, so several pollers may share
+    the file without losing each other's watermarks, and a crash never leaves it half written.
+    """
+
+    def __init__(self, path: str = 'dmhy_state.sqlite3'):
+        self.path = path
+
+        # The connection is shared by the threads of the searcher, the lock serializes them
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        log.debug("Watermark store opened: %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'WatermarkStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, key: str) -> Optional[Watermark]:
+        with self._lock:
+            row = self._conn.execute("SELECT infohash, timestamp FROM watermarks WHERE key = ?", (key,)).fetchone()
+        return Watermark(*row) if row is not None else None
+
+    def set(self, key: str, watermark: Watermark) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO watermarks (key, infohash, timestamp) VALUES (?, ?, ?)",
+                               (key, watermark.infohash, watermark.timestamp))
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM watermarks WHERE key = ?", (key,))
@@ -10,8 +10,11 @@ def read_requirements():
 setup(
     name='Dmhylib',
     version='2.0.0',
-    packages=find_packages(exclude=['tests*']),
+    packages=find_packages(exclude=['tests*', 'benchmarks*']),
     install_requires=read_requirements(),
+    extras_require={
+        'async': ['aiohttp>=3.8'],
+    },
     entry_points={
         'console_scripts': ['dmhysearch=dmhylib.cli:main'],
     },
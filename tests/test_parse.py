@@ -0,0 +1,27 @@
+import glob
+import gzip
+import os
+
+import pytest
+
+from dmhylib.parse import DEFAULT_TIMEFMT, FAST_PARSER, parse_page
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures', '*.html.gz')))
+
+
+@pytest.mark.parametrize('timefmt', [DEFAULT_TIMEFMT, '%Y-%m-%d %H:%M:%S'])
+@pytest.mark.parametrize('fixture', FIXTURES, ids=os.path.basename)
+def test_fast_parser_matches_beautifulsoup(fixture: str, timefmt: str) -> None:
+    with gzip.open(fixture, 'rb') as f:
+        html = f.read()
+
+    assert parse_page(html, FAST_PARSER, timefmt) == parse_page(html, 'lxml', timefmt)
+
+
+def test_fixtures_have_rows() -> None:
+    # Guards the comparison above against passing on pages where both parsers find nothing
+    pages = [fixture for fixture in FIXTURES if not fixture.endswith('empty.html.gz')]
+    assert pages
+    for fixture in pages:
+        with gzip.open(fixture, 'rb') as f:
+            assert parse_page(f.read(), 'lxml')